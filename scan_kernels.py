@@ -0,0 +1,54 @@
+"""Substring-scan kernels for the Dictionary Classifier.
+
+Kept outside `streamlit_app.py` because Streamlit re-executes the app script on
+every rerun: a JIT function defined there would get a fresh dispatcher (and a
+fresh compile) each time. Imported once, this module keeps one dispatcher per
+process, and `cache=True` persists the compiled kernel across restarts.
+"""
+import numpy as np
+
+try:
+    import numba  # optional: JIT substring kernel when pyahocorasick is missing
+except ImportError:
+    numba = None
+
+
+def pack_strings(strings) -> tuple:
+    """Concatenate strings as UTF-8 into one uint8 buffer plus an offsets array."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+if numba is not None:
+    @numba.njit(cache=True, parallel=True)
+    def scan_batch(text_buf, text_offsets, pat_buf, pat_offsets, shifts):
+        """Boyer-Moore-Horspool search of every pattern in every text; rows run in parallel."""
+        n_texts = len(text_offsets) - 1
+        n_pats = len(pat_offsets) - 1
+        out = np.zeros((n_texts, n_pats), dtype=np.bool_)
+        for i in numba.prange(n_texts):
+            t0 = text_offsets[i]
+            n = text_offsets[i + 1] - t0
+            for j in range(n_pats):
+                p0 = pat_offsets[j]
+                m = pat_offsets[j + 1] - p0
+                if m == 0:
+                    out[i, j] = True
+                    continue
+                last = pat_buf[p0 + m - 1]
+                k = 0
+                while k <= n - m:
+                    c = text_buf[t0 + k + m - 1]
+                    if c == last:
+                        q = 0
+                        while q < m - 1 and text_buf[t0 + k + q] == pat_buf[p0 + q]:
+                            q += 1
+                        if q == m - 1:
+                            out[i, j] = True
+                            break
+                    k += shifts[j, c]
+        return out
+else:
+    scan_batch = None
@@ -1,6 +1,18 @@
 import streamlit as st
 import pandas as pd
-from io import StringIO
+import numpy as np
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+try:
+    import ahocorasick  # optional: single-pass multi-keyword scanning
+except ImportError:
+    ahocorasick = None
+
+from scan_kernels import pack_strings, scan_batch  # scan_batch is None without numba
 
 # =========================
 #  Streamlit – Dictionary Classifier
@@ -46,47 +58,90 @@ if "dictionaries" not in st.session_state:
 dictionaries = st.session_state["dictionaries"]
 
 # 2️⃣ ---- FILE UPLOAD ----
+# Parsed uploads are cached per session and keyed on `upload_key`, a digest of the
+# bytes computed once per rerun; `_data` itself is not hashed by Streamlit.
+@st.cache_data(show_spinner=False, scope="session", max_entries=4, ttl="1h")
+def read_columns(upload_key: str, _data: bytes) -> list:
+    """Return the CSV header only, so schema errors surface without a full parse."""
+    return list(pd.read_csv(BytesIO(_data), nrows=0).columns)
+
+
+@st.cache_data(show_spinner=False, scope="session", max_entries=2, ttl="1h")
+def load_csv(upload_key: str, _data: bytes, statement_only: bool = False) -> pd.DataFrame:
+    """Parse uploaded CSV bytes; memoized so reruns skip re-parsing the same file."""
+    if statement_only:
+        return pd.read_csv(
+            BytesIO(_data), usecols=["Statement"], dtype={"Statement": "string[pyarrow]"}
+        )
+    df = pd.read_csv(BytesIO(_data))
+    # Arrow-backed strings: contiguous buffers and C++ string kernels
+    df["Statement"] = df["Statement"].astype("string[pyarrow]")
+    return df
+
+
 st.subheader("1. Upload your CSV")
 
 uploaded_file = st.file_uploader("Upload a CSV file", type=["csv"])
+statement_only = st.checkbox(
+    "Keep only Statement column",
+    value=False,
+    help="Skip parsing every other column; faster and lighter for wide files.",
+)
 
+df = None
 if uploaded_file is not None:
+    data = uploaded_file.getvalue()
+    upload_key = hashlib.sha1(data).hexdigest()
     try:
-        df = pd.read_csv(uploaded_file)
+        if "Statement" not in read_columns(upload_key, data):
+            st.error("❌ No 'Statement' column found in the uploaded file. Please include a column named `Statement`.")
+        else:
+            df = load_csv(upload_key, data, statement_only)
     except Exception as e:
         st.error(f"Error reading CSV: {e}")
-        df = None
-else:
-    df = None
 
 if df is not None:
     st.write("Preview of uploaded data:")
     st.dataframe(df.head(), use_container_width=True)
-
-    if "Statement" not in df.columns:
-        st.error("❌ No 'Statement' column found in the uploaded file. Please include a column named `Statement`.")
-else:
+elif uploaded_file is None:
     st.info("Upload a CSV to continue.")
 
 # 3️⃣ ---- DICTIONARY EDITOR ----
 st.subheader("2. Edit tactic dictionaries")
 
-st.markdown("Each tactic is a **group of keywords/phrases**. Enter keywords separated by commas.")
-
-# Existing tactic editors
-for tactic in list(dictionaries.keys()):
-    with st.expander(f"Tactic: `{tactic}`", expanded=False):
-        current_keywords = ", ".join(dictionaries[tactic])
-        new_value = st.text_area(
-            f"Keywords for `{tactic}` (comma-separated)",
-            value=current_keywords,
-            key=f"text_{tactic}",
-            height=100
-        )
-        # Update keywords from textarea
-        dictionaries[tactic] = [
-            kw.strip() for kw in new_value.split(",") if kw.strip()
-        ]
+st.markdown("Each tactic is a **group of keywords/phrases**. Enter keywords separated by commas; add or delete rows to add or remove tactics.")
+
+# Existing tactic editors: one table, batched in a form so edits apply once on submit
+with st.form("edit_dicts"):
+    editor_df = pd.DataFrame({
+        "tactic": list(dictionaries.keys()),
+        "keywords": [", ".join(v) for v in dictionaries.values()],
+    })
+    edited = st.data_editor(
+        editor_df,
+        num_rows="dynamic",
+        key="dict_editor",
+        width="stretch",
+        hide_index=True,
+        column_config={
+            "tactic": st.column_config.TextColumn("Tactic", required=True),
+            "keywords": st.column_config.TextColumn("Keywords (comma-separated)", width="large"),
+        },
+    )
+    st.caption("Save your table edits before using **Add tactic** below; adding a tactic discards unsaved edits.")
+    if st.form_submit_button("Save keywords"):
+        edited = edited.fillna("")
+        names = edited["tactic"].astype(str).str.strip()
+        duplicates = sorted(set(names[names.ne("") & names.duplicated()]))
+        if duplicates:
+            st.warning(f"Duplicate tactic names: {', '.join(duplicates)}. Rename them before saving.")
+        else:
+            # Rebuild dictionaries from the edited table in one pass
+            dictionaries = {
+                name: [kw.strip() for kw in str(keywords).split(",") if kw.strip()]
+                for name, keywords in zip(names, edited["keywords"])
+                if name
+            }
 
 # Add a new tactic
 st.markdown("---")
@@ -111,48 +166,237 @@ if st.button("Add tactic"):
         ]
         st.success(f"Added tactic `{new_tactic_name}`.")
         # trigger re-render with updated state
-        st.experimental_rerun()
+        st.rerun()
 
 st.session_state["dictionaries"] = dictionaries
 
-# Convert to sets for classification logic (like original script)
-dicts_for_classification = {k: set(v) for k, v in dictionaries.items()}
-
 # 4️⃣ ---- CLASSIFICATION FUNCTION ----
-def classify(text: str, dictionaries: dict) -> dict:
-    """Return {tactic: {present,bool; count,int; matches,list}}."""
-    text_lower = str(text).lower()
-    result = {}
-    for tactic, keywords in dictionaries.items():
-        matches = [kw for kw in keywords if kw.lower() in text_lower]
-        result[tactic] = {
-            "present": bool(matches),
-            "count": len(matches),
-            "matches": matches,
-        }
-    return result
+# Compiled matchers are shared by all sessions; cap how many keyword sets are kept
+MAX_COMPILED_ENTRIES = 64
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_COMPILED_ENTRIES)
+def build_automaton(keyword_lists: tuple):
+    """Build one Aho-Corasick automaton over several (lowercase) keyword tuples.
+
+    Each keyword is added once; its value lists every (list index, keyword index) it stands for.
+    """
+    targets = {}
+    for t, keywords_lower in enumerate(keyword_lists):
+        for col, kw in enumerate(keywords_lower):
+            targets.setdefault(kw, []).append((t, col))
+    automaton = ahocorasick.Automaton()
+    for kw, hits in targets.items():
+        automaton.add_word(kw, tuple(hits))
+    automaton.make_automaton()
+    return automaton
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_COMPILED_ENTRIES)
+def build_shift_table(keywords_lower: tuple) -> tuple:
+    """Pack UTF-8 keywords into (bytes, offsets, Horspool bad-character shifts[keyword, byte])."""
+    pat_buf, pat_offsets = pack_strings(keywords_lower)
+    shifts = np.empty((len(keywords_lower), 256), dtype=np.int32)
+    for j in range(len(keywords_lower)):
+        pat = pat_buf[pat_offsets[j]:pat_offsets[j + 1]]
+        m = len(pat)
+        shifts[j, :] = max(m, 1)
+        for i in range(m - 1):
+            shifts[j, pat[i]] = m - 1 - i
+    return pat_buf, pat_offsets, shifts
+
+
+def scan(statements_lower: pd.Series, keywords_lower: list) -> np.ndarray:
+    """Return a (rows, keywords) bool matrix: True where the keyword occurs in the statement.
+
+    Both inputs must already be lowercased; no case folding happens in here.
+    """
+    M = np.zeros((len(statements_lower), len(keywords_lower)), dtype=bool)
+    if not keywords_lower:
+        return M
+    if scan_batch is not None:
+        text_buf, text_offsets = pack_strings(statements_lower.fillna("").to_numpy())
+        return scan_batch(text_buf, text_offsets, *build_shift_table(tuple(keywords_lower)))
+    # One alternation regex finds rows with any hit; per-keyword checks then run on those only
+    pattern = "|".join(re.escape(kw) for kw in keywords_lower)
+    candidates = np.flatnonzero(
+        statements_lower.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+    )
+    subset = statements_lower.iloc[candidates]
+    # Keywords are independent and Arrow's string kernels release the GIL
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        hits = executor.map(
+            lambda kw: subset.str.contains(kw, regex=False, na=False).to_numpy(dtype=bool),
+            keywords_lower,
+        )
+        for col, hit in enumerate(hits):
+            M[candidates, col] = hit
+    return M
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_COMPILED_ENTRIES)
+def compile_dictionaries(frozen_items: tuple) -> dict:
+    """Return {tactic: (sorted unique keywords, lowercased keywords)} as tuples, shared across sessions.
+
+    `frozen_items` is ((tactic, (keyword, ...)), ...) so the cache key is hashable and small.
+    """
+    compiled = {}
+    for tactic, keywords in frozen_items:
+        keywords = tuple(sorted(set(keywords)))
+        compiled[tactic] = (keywords, tuple(kw.lower() for kw in keywords))
+    return compiled
+
+
+def freeze_dictionaries(dictionaries: dict) -> tuple:
+    """Hashable ((tactic, sorted keywords), ...) form of the editable dictionaries."""
+    return tuple((t, tuple(sorted(v))) for t, v in dictionaries.items())
+
+
+def scan_tactics(statements_lower: pd.Series, keyword_lists: list) -> list:
+    """Scan each tactic's keyword list; returns one bool matrix per tactic."""
+    if ahocorasick is not None:
+        Ms = [np.zeros((len(statements_lower), len(kws)), dtype=bool) for kws in keyword_lists]
+        if not any(keyword_lists):
+            return Ms
+        # Single pass per statement over one automaton shared by all the given tactics
+        automaton = build_automaton(tuple(keyword_lists))
+        for row, text in enumerate(statements_lower.fillna("").to_numpy()):
+            for _, hits in automaton.iter(text):
+                for t, col in hits:
+                    Ms[t][row, col] = True
+        return Ms
+    if scan_batch is not None:
+        # One fused kernel over every tactic's keywords; prange already spreads rows over cores
+        fused = scan(statements_lower, [kw for kws in keyword_lists for kw in kws])
+        bounds = np.cumsum([0] + [len(kws) for kws in keyword_lists])
+        return [fused[:, a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    return [scan(statements_lower, kws) for kws in keyword_lists]
+
+
+def match_labels(M: np.ndarray, keywords: list) -> pd.Categorical:
+    """Join matched keywords per row, building each distinct hit pattern's label only once."""
+    # Collapse each row to one scalar key; np.unique(M, axis=0) sorts slow void records
+    if M.shape[1] <= 64:
+        row_keys = M @ (np.uint64(1) << np.arange(M.shape[1], dtype=np.uint64))
+    else:
+        packed = np.ascontiguousarray(np.packbits(M, axis=1))
+        row_keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+    _, first, codes = np.unique(row_keys, return_index=True, return_inverse=True)
+    labels = [", ".join(kw for kw, h in zip(keywords, row) if h) for row in M[first]]
+    return pd.Categorical.from_codes(codes.ravel(), categories=labels)
+
+
+def classify(df: pd.DataFrame, compiled: dict) -> pd.DataFrame:
+    """Add {tactic}_present / _count / _matches columns via column-wide keyword scans."""
+    statements_lower = df["Statement"].astype("string[pyarrow]").str.lower()
+    # Classify each distinct statement once, then broadcast back to rows
+    codes, unique = pd.factorize(statements_lower, use_na_sentinel=False)
+    unique = pd.Series(unique)
+    tactics = list(compiled)
+    present = np.zeros((len(unique), len(tactics)), dtype=bool)
+    counts = np.zeros((len(unique), len(tactics)), dtype=np.int16)
+    matches = []
+    # Blank statements can't contain a keyword; only scan the rest
+    scan_rows = np.flatnonzero(unique.str.strip().str.len().fillna(0).to_numpy() > 0)
+    scans = scan_tactics(unique.iloc[scan_rows], [compiled[t][1] for t in tactics])
+    for j, (tactic, hits) in enumerate(zip(tactics, scans)):
+        keywords = compiled[tactic][0]
+        M = np.zeros((len(unique), hits.shape[1]), dtype=bool)
+        M[scan_rows] = hits
+        present[:, j] = M.any(axis=1)
+        counts[:, j] = M.sum(axis=1)
+        matches.append(match_labels(M, keywords))
+
+    # Columnar assignment: one array per output column, no per-row dicts
+    for j, tactic in enumerate(tactics):
+        df[f"{tactic}_present"] = present[codes, j]
+        df[f"{tactic}_count"] = pd.to_numeric(counts[codes, j], downcast="unsigned")
+        df[f"{tactic}_matches"] = matches[j][codes]
+    return df
+
+
+def statements_digest(statements: pd.Series) -> str:
+    """Cheap content hash of the Statement column, used as the classification cache key."""
+    hashed = pd.util.hash_pandas_object(statements, index=False).to_numpy()
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+def classify_tactics(statements_key: str, statements: pd.Series, frozen_items: tuple) -> pd.DataFrame:
+    """Return the classification columns for every tactic, reusing per-tactic results.
+
+    Results are kept in session state per (statements digest, frozen tactic), so
+    editing one tactic leaves the others' results in place. All tactics that miss
+    go through a single classify() call, sharing one lowercase/dedup pass and,
+    where the backend supports it, one scan over every missing tactic.
+    """
+    cache = st.session_state.setdefault("tactic_results", {})
+    missing = tuple(ft for ft in frozen_items if (statements_key, ft) not in cache)
+    if missing:
+        result = classify(
+            pd.DataFrame({"Statement": statements.to_numpy()}), compile_dictionaries(missing)
+        )
+        for tactic, keywords in missing:
+            cols = [f"{tactic}_present", f"{tactic}_count", f"{tactic}_matches"]
+            cache[(statements_key, (tactic, keywords))] = result[cols]
+
+    # Keep only the current file's current tactics, so the cache stays bounded
+    wanted = {(statements_key, ft) for ft in frozen_items}
+    for key in [k for k in cache if k not in wanted]:
+        del cache[key]
+    if not frozen_items:
+        return pd.DataFrame(index=range(len(statements)))
+    return pd.concat([cache[(statements_key, ft)] for ft in frozen_items], axis=1)
+
+
+def result_digest(upload_key: str, statement_only: bool, frozen_items: tuple) -> str:
+    """Exact key for a classified frame: the uploaded bytes, parse option and dictionaries."""
+    return hashlib.sha1(repr((upload_key, statement_only, frozen_items)).encode()).hexdigest()
+
+
+@st.cache_data(show_spinner=False, scope="session", max_entries=1, ttl="1h")
+def to_csv_bytes(result_key: str, _df: pd.DataFrame) -> bytes:
+    """Serialize straight to UTF-8 bytes; memoized on `result_key` (`_df` is not hashed).
+
+    Streamlit hashes only a sample of large DataFrames, so the frame itself can't be the key.
+    Only the session's current result is kept, so old downloads don't pile up in memory.
+    """
+    buf = BytesIO()
+    _df.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
+
+
+@st.cache_data(show_spinner=False, scope="session", max_entries=1, ttl="1h")
+def to_parquet_bytes(result_key: str, _df: pd.DataFrame) -> bytes:
+    """Serialize to zstd-compressed Parquet; memoized on `result_key` like to_csv_bytes."""
+    buf = BytesIO()
+    _df.to_parquet(buf, engine="pyarrow", compression="zstd", index=False)
+    return buf.getvalue()
 
 # 5️⃣ ---- RUN CLASSIFICATION ----
 st.subheader("3. Run classification")
 
 if df is not None and "Statement" in df.columns:
+    result_key = result_digest(upload_key, statement_only, freeze_dictionaries(dictionaries))
+
     if st.button("🔎 Classify statements"):
         # Apply classification
-        df["classification"] = df["Statement"].apply(
-            lambda s: classify(s, dicts_for_classification)
+        statements = df["Statement"]
+        statements_key = statements_digest(statements)
+        classified = classify_tactics(
+            statements_key, statements, freeze_dictionaries(dictionaries)
         )
+        # Join all tactics' columns onto the upload in one assignment
+        classified.index = df.index
+        st.session_state["classified"] = (result_key, df.assign(**classified))
 
-        # Flatten the nested dict
-        for tactic in dicts_for_classification:
-            df[f"{tactic}_present"] = df["classification"].apply(
-                lambda d: d[tactic]["present"]
-            )
-            df[f"{tactic}_count"] = df["classification"].apply(
-                lambda d: d[tactic]["count"]
-            )
-            df[f"{tactic}_matches"] = df["classification"].apply(
-                lambda d: ", ".join(d[tactic]["matches"])
-            )
+    # Keep showing the result across reruns (e.g. switching download format)
+    # until the upload or the dictionaries change
+    stored = st.session_state.get("classified")
+    if stored is not None and stored[0] != result_key:
+        del st.session_state["classified"]
+        stored = None
+
+    if stored is not None:
+        df = stored[1]
 
         st.success("✅ Classification complete!")
 
@@ -160,17 +404,22 @@ if df is not None and "Statement" in df.columns:
         st.dataframe(df, use_container_width=True)
 
         # 6️⃣ ---- DOWNLOAD RESULT ----
-        st.markdown("### 4. Download classified CSV")
+        download_format = st.radio("Download format", ["CSV", "Parquet"], horizontal=True)
+        st.markdown(f"### 4. Download classified {download_format}")
 
-        csv_buffer = StringIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_bytes = csv_buffer.getvalue().encode("utf-8")
-
-        st.download_button(
-            label="⬇️ Download `classified_output.csv`",
-            data=csv_bytes,
-            file_name="classified_output.csv",
-            mime="text/csv",
-        )
+        if download_format == "Parquet":
+            st.download_button(
+                label="⬇️ Download `classified_output.parquet`",
+                data=to_parquet_bytes(result_key, df),
+                file_name="classified_output.parquet",
+                mime="application/vnd.apache.parquet",
+            )
+        else:
+            st.download_button(
+                label="⬇️ Download `classified_output.csv`",
+                data=to_csv_bytes(result_key, df),
+                file_name="classified_output.csv",
+                mime="text/csv",
+            )
 else:
     st.info("Once a valid CSV (with `Statement` column) is uploaded, you can run classification here.")